@@ -0,0 +1,66 @@
+"""Startup-time benchmark of the chiafan command line client.
+
+Run it from the root of the repository:
+
+    python benchmarks/startup.py
+
+It fails (exit code 1) if a client subcommand takes longer than the
+budget to start, or if starting it pulls in the daemon's modules.
+"""
+import sys
+import time
+import subprocess
+import click
+
+
+# Modules that only the daemon needs
+HEAVY_MODULES = ['flask', 'chiafan.app', 'chiafan.chia_manager']
+
+IMPORT_CHECK = f'''
+import sys
+import chiafan.cli
+heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+if len(heavy) > 0:
+    print(' '.join(heavy))
+    sys.exit(1)
+'''
+
+
+def time_command(args, num_runs: int) -> float:
+    """Returns the best wall time in seconds out of num_runs runs."""
+    best = None
+    for _ in range(num_runs):
+        start = time.perf_counter()
+        subprocess.run(args, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@click.command()
+@click.option('--num_runs', default = 5,
+              type = click.INT, help = 'The number of runs of each command')
+@click.option('--budget', default = 0.5,
+              type = click.FLOAT, help = 'The maximum startup time in seconds')
+def main(num_runs, budget):
+    proc = subprocess.run([sys.executable, '-c', IMPORT_CHECK],
+                          stdout = subprocess.PIPE)
+    if proc.returncode != 0:
+        click.echo(f'chiafan.cli imports daemon modules: {proc.stdout.decode().strip()}')
+        sys.exit(1)
+
+    client = [sys.executable, '-c', 'from chiafan.cli import main; main()',
+              '--control_socket', '/nonexistent/chiafan.sock']
+    failed = False
+    for name, args in [('python', [sys.executable, '-c', 'pass']),
+                       ('help', client + ['--help']),
+                       ('status', client + ['status'])]:
+        elapsed = time_command(args, num_runs)
+        over_budget = name != 'python' and elapsed > budget
+        failed = failed or over_budget
+        click.echo(f'{name:<10} {elapsed * 1000.0:8.1f} ms{"  OVER BUDGET" if over_budget else ""}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
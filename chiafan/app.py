@@ -1,12 +1,12 @@
 import os
 import sys
 import signal
-import click
 import logging
 from pathlib import Path
 
 from flask import current_app, g, Flask, redirect, render_template, request, url_for
 from .chia_manager import ChiaManager
+from .control import ControlServer, ControlError
 
 
 root_logger = logging.getLogger()
@@ -17,17 +17,28 @@ app.secret_key = b'\xb7\x0b\x86\xc0+\x1a&\xd6 \xdfx\\\x90O\xac\xae'
 app.config['extra_fields'] = []
 
 
-@app.route('/status', methods = [ 'GET', 'POST' ])
-def handle_status():
+# The commands below are served both over HTTP and over the control
+# socket used by the command line client.
+
+def status():
     return {
         'server': ChiaManager().inspect(),
         'workers': ChiaManager().inspect_workers(),
-        'jobs': [status.to_payload() for status in ChiaManager().get_status()],
+        'jobs': [job_status.to_payload() for job_status in ChiaManager().get_status()],
     }
 
 
-@app.route('/start', methods = [ 'GET', 'POST' ])
-def handle_start():
+def start(target: str = None):
+    if target is not None:
+        if not ChiaManager().undrain_worker(target):
+            return {
+                'code': 'failed',
+                'target': target
+            }
+        return {
+            'code': 'started',
+            'target': target
+        }
     if ChiaManager().thread is None:
         num_workers = len(ChiaManager().workers)
         logging.info(f'Start running plotting jobs with {num_workers} workers.')
@@ -35,52 +46,115 @@ def handle_start():
     elif ChiaManager().draining:
         logging.info('Resume from draining')
         ChiaManager().run()
+    elif ChiaManager().runtime_failed():
+        # run() checks the chiabox docker again
+        ChiaManager().run()
     return {
         'code': 'started'
     }
 
 
-@app.route('/drain', methods = [ 'GET', 'POST' ])
-def handle_drain():
+def drain(target: str = None):
+    if target is not None:
+        if not ChiaManager().drain_worker(target):
+            return {
+                'code': 'failed',
+                'target': target
+            }
+        return {
+            'code': 'drained',
+            'target': target
+        }
     ChiaManager().drain()
     return {
         'code': 'drained'
     }
 
 
-@app.route('/abort', methods = [ 'GET', 'POST' ])
-def handle_abort():
-    ChiaManager().abort_job(request.json['target'])
+def pause(target: str, release_cpus: bool = False):
+    return {
+        'code': 'paused' if ChiaManager().pause_worker(target, release_cpus = release_cpus) else 'failed',
+        'target': target
+    }
+
+
+def resume(target: str, force: bool = False):
+    return {
+        'code': 'resumed' if ChiaManager().resume_worker(target, force = force) else 'failed',
+        'target': target
+    }
+
+
+def abort(target: str):
+    ChiaManager().abort_job(target)
     return {
         'code': 'aborted',
-        'target': request.json['target']
+        'target': target
     }
 
 
+CONTROL_HANDLERS = {
+    'ping': lambda: { 'code': 'pong' },
+    'status': status,
+    'start': start,
+    'drain': drain,
+    'pause': pause,
+    'resume': resume,
+    'abort': abort,
+}
+
+
+@app.route('/status', methods = [ 'GET', 'POST' ])
+def handle_status():
+    return status()
+
+
+@app.route('/inventory', methods = [ 'GET', 'POST' ])
+def handle_inventory():
+    return ChiaManager().inspect_inventory()
+
+
+@app.route('/start', methods = [ 'GET', 'POST' ])
+def handle_start():
+    return start((request.get_json(silent = True) or {}).get('target'))
+
+
+@app.route('/drain', methods = [ 'GET', 'POST' ])
+def handle_drain():
+    return drain((request.get_json(silent = True) or {}).get('target'))
+
+
+@app.route('/pause', methods = [ 'GET', 'POST' ])
+def handle_pause():
+    return pause(request.json['target'],
+                 release_cpus = request.json.get('release_cpus', False))
+
+
+@app.route('/resume', methods = [ 'GET', 'POST' ])
+def handle_resume():
+    return resume(request.json['target'], force = request.json.get('force', False))
+
+
+@app.route('/abort', methods = [ 'GET', 'POST' ])
+def handle_abort():
+    return abort(request.json['target'])
+
+
+control_server = None
+
+
 def cleanup(signum, frame):
+    if control_server is not None:
+        control_server.ensure_shutdown()
     ChiaManager().ensure_shutdown()
     sys.exit(0)
-    
-
-@click.command()
-@click.option('--farm_key', default = '',
-              type = click.STRING, help = 'Farm key')
-@click.option('--pool_key', default = '',
-              type = click.STRING, help = 'Pool Key')
-@click.option('workers', '--worker', multiple = True,
-              type = click.STRING, help = 'a WORKSPACE:DESTINATION pair')
-@click.option('--is_mock', default = False,
-              type = click.BOOL, help = 'Whether to run plotter simulator')
-@click.option('--port', default = '5000',
-              type = click.STRING, help = 'Specify the port')
-# Enable threading to avoid writing to the disk simultaneously
-@click.option('--staggering', default = 600,
-              type = click.INT, help = 'Staggering in seconds for multi-threading')
-@click.option('--forward_concurrency', default = 4,
-              type = click.INT, help = 'The number of threads used for the forward stage of each job')
-@click.option('--use_chiabox', default = True,
-              type = click.BOOL, help = 'whether it relies on the chiabox docker')
-def main(workers, farm_key, pool_key, is_mock, port, staggering, forward_concurrency, use_chiabox):
+
+
+def serve(workers, farm_key, pool_key, is_mock, port, staggering, forward_concurrency, use_chiabox,
+          verify_plots, verify_challenges, verify_concurrency,
+          plot_dirs, plot_index, inventory_interval, control_socket):
+    """Run the chiafan daemon, see chiafan.cli for the options."""
+    global control_server
     signal.signal(signal.SIGINT, cleanup)
     signal.signal(signal.SIGTERM, cleanup)
     # TODO(breakds): Support chia (in addtion to chiafunc) as well
@@ -88,14 +162,27 @@ def main(workers, farm_key, pool_key, is_mock, port, staggering, forward_concurr
     ChiaManager().set_pool_key(pool_key)
     ChiaManager().set_staggering_sec(staggering)
     ChiaManager().set_use_chiabox(use_chiabox)
+    if verify_plots:
+        ChiaManager().set_plot_verifier(num_challenges = verify_challenges,
+                                        max_workers = verify_concurrency)
+    if plot_index != '':
+        ChiaManager().set_plot_inventory(index_path = Path(plot_index),
+                                         plot_dirs = [Path(x) for x in plot_dirs],
+                                         interval_sec = inventory_interval)
     for worker_spec in workers:
         workspace, destination = worker_spec.split(':')
         ChiaManager().add_worker(workspace = Path(workspace),
                                  destination = Path(destination),
                                  forward_concurrency = forward_concurrency,
                                  is_mock = is_mock)
+    # Bind the control socket before any background thread of the
+    # manager is started, so that failing to do so can exit cleanly.
+    if control_socket != '':
+        try:
+            control_server = ControlServer(control_socket, CONTROL_HANDLERS)
+        except ControlError:
+            ChiaManager().ensure_shutdown()
+            raise
+        control_server.start()
+    ChiaManager().start_plot_inventory()
     app.run(host = '0.0.0.0', port = port)
-
-
-if __name__ == '__main__':
-    main()
@@ -4,8 +4,10 @@ from datetime import datetime, timedelta
 import logging
 import threading
 from pathlib import Path
-from .job import PlottingJob, JobState
+from .job import PlottingJob, JobState, Stage
 from .worker import PlottingWorker
+from .verifier import PlotVerifier
+from .inventory import PlotInventory
 from .utils import check_chiabox_docker_status
 
 class ChiaManager(object):
@@ -17,7 +19,9 @@ class ChiaManager(object):
             cls._instance.shutting_down = False
             cls._instance.staggering_sec = 600
             cls._instance.workers = []
-            cls._instance.past_jobs_status = []
+            # Jobs are kept (rather than their status) so that results
+            # of verifications that finish later are reflected.
+            cls._instance.past_jobs = []
             # If use_chiabox is set to True, the manager will assume
             # the docker container chiabox exists and view it as the
             # only chia command provider.
@@ -26,6 +30,17 @@ class ChiaManager(object):
             cls._instance.pool_key = ''
             cls._instance.thread = None
             cls._instance.draining = False
+            # Optional post-plot verification, see set_plot_verifier()
+            cls._instance.verifier = None
+            # Optional index of the plots on the destinations, see
+            # set_plot_inventory()
+            cls._instance.inventory = None
+            cls._instance.inventory_thread = None
+            cls._instance.inventory_interval_sec = 300
+            # The chiabox health check runs alongside the first jobs,
+            # which wait for its outcome, see wait_for_runtime().
+            cls._instance.runtime_checked = threading.Event()
+            cls._instance.runtime_ok = False
         return cls._instance
 
 
@@ -45,6 +60,51 @@ class ChiaManager(object):
         self.use_chiabox = value
 
 
+    def set_plot_verifier(self, num_challenges: int = 30, max_workers: int = 1):
+        self.verifier = PlotVerifier(num_challenges = num_challenges,
+                                     max_workers = max_workers)
+
+
+    def set_plot_inventory(self, index_path: Path, plot_dirs = [],
+                           interval_sec: int = 300):
+        """Keep an index of the plots in plot_dirs and the destinations
+        of the workers, refreshed every interval_sec seconds once
+        start_plot_inventory() is called.
+        """
+        self.inventory = PlotInventory(index_path)
+        self.inventory_interval_sec = interval_sec
+        for plot_dir in plot_dirs:
+            self.inventory.add_directory(plot_dir)
+        for worker in self.workers:
+            self.inventory.add_directory(worker.destination)
+
+
+    def start_plot_inventory(self):
+        """Start refreshing the plot inventory in the background.
+
+        This should be called after all the workers are added, so that
+        the first refresh covers their destinations.
+        """
+        if self.inventory is None or self.inventory_thread is not None:
+            return
+        self.inventory_thread = threading.Thread(target = ChiaManager._run_inventory,
+                                                 args = (self,))
+        self.inventory_thread.start()
+
+
+    def _run_inventory(self):
+        last_refresh_time = None
+        while not self.shutting_down:
+            if (last_refresh_time is None or
+                (datetime.now() - last_refresh_time).total_seconds() > self.inventory_interval_sec):
+                try:
+                    self.inventory.refresh()
+                except Exception as err:
+                    logging.warning(f'Failed to refresh the plot inventory: {err}')
+                last_refresh_time = datetime.now()
+            time.sleep(1)
+
+
     def add_worker(self, workspace: Path, destination: Path,
                    forward_concurrency: int = 2,
                    is_mock: bool = False):
@@ -56,6 +116,8 @@ class ChiaManager(object):
             forward_concurrency = forward_concurrency,
             use_chiabox = self.use_chiabox,
             is_mock = is_mock))
+        if self.inventory is not None:
+            self.inventory.add_directory(destination)
 
 
     def drain(self):
@@ -71,13 +133,18 @@ class ChiaManager(object):
             self.thread.start()
         else:
             self.draining = False
+            if self.runtime_failed():
+                logging.info('Checking chiabox docker again')
+                self._start_runtime_check()
 
 
     def _run(self):
         is_mock = self.workers[0].is_mock
         if not is_mock and self.use_chiabox:
-            if not ChiaManager._wait_for_chiabox_docker(20):
-                raise RuntimeError('Chiabox docker failed to start')
+            self._start_runtime_check()
+        else:
+            self.runtime_ok = True
+            self.runtime_checked.set()
 
         while True:
             if self.shutting_down:
@@ -93,30 +160,76 @@ class ChiaManager(object):
                             youngest_job_starting_time, worker.current_job.starting_time)
                 can_spawn =  (datetime.now() - youngest_job_starting_time).total_seconds() > self.staggering_sec
 
-                if (not self.draining) and can_spawn:
+                # Jobs spawned after a failed health check would fail
+                # right away, so wait until it passes on /start.
+                if (not self.draining) and (not self.runtime_failed()) and can_spawn:
                     # Not check for cpu availability
                     available_cpus = os.cpu_count() - self.used_cpu_count()
                     for worker in self.workers:
-                        if worker.current_job is None and worker.forward_concurrency <= available_cpus:
-                            worker.spawn_job(self.farm_key, self.pool_key)
+                        if (worker.current_job is None and
+                            not worker.draining and
+                            worker.forward_concurrency <= available_cpus and
+                            self.has_room(worker)):
+                            worker.spawn_job(self.farm_key, self.pool_key,
+                                             verifier = self.verifier,
+                                             wait_for_runtime = self.wait_for_runtime)
                             # Only start one at one time maximum because of staggering
                             break
                 for worker in self.workers:
                     if worker.current_job is None:
                         # Note that this only happens in draining mode
                         continue
-                    if worker.current_job.state is not JobState.ONGOING:
+                    # A job under verification no longer needs the
+                    # worker, which is released for the next plot.
+                    if (worker.current_job.state is not JobState.ONGOING or
+                        worker.current_job.stage is Stage.VERIFICATION):
                         if worker.current_job.state is JobState.FAIL:
                             job_name = worker.current_job.job_name
                             error_message = worker.current_job.error_message
                             logging.error(f'Job {job_name} failed due to "{error_message}"')
-                        worker.current_job.thread.join()
-                        self.past_jobs_status.append(worker.current_job.inspect())
+                        job = worker.current_job
+                        job.thread.join()
+                        self.past_jobs.append(job)
                         worker.current_job = None
+                        if self.inventory is not None and job.final_plot is not None:
+                            # Failing to index the plot must not hold
+                            # the worker back.
+                            try:
+                                self.inventory.add_plot(Path(job.final_plot))
+                            except Exception as err:
+                                logging.warning(f'Cannot add {job.final_plot} to the plot inventory: {err}')
             except Exception as err:
                 logging.warning(f'Problem encountered: {err}. Will wait and try again.')
             time.sleep(1.6)
 
+    def _start_runtime_check(self):
+        self.runtime_ok = False
+        self.runtime_checked.clear()
+        threading.Thread(target = ChiaManager._check_runtime,
+                         args = (self,)).start()
+
+
+    def _check_runtime(self):
+        self.runtime_ok = ChiaManager._wait_for_chiabox_docker(20)
+        if not self.runtime_ok:
+            logging.error('Stop spawning jobs as chiabox docker failed to start, '
+                          'it will be checked again on /start')
+        self.runtime_checked.set()
+
+
+    def runtime_failed(self) -> bool:
+        return self.runtime_checked.is_set() and not self.runtime_ok
+
+
+    def wait_for_runtime(self) -> bool:
+        """Block until the chiabox health check is done.
+
+        Returns whether the jobs can run.
+        """
+        self.runtime_checked.wait()
+        return self.runtime_ok
+
+
     @staticmethod
     def _wait_for_chiabox_docker(num_trials: int = 20):
         """Returns true if the chiabox docker is up.
@@ -141,11 +254,33 @@ class ChiaManager(object):
         for worker in self.workers:
             if worker.current_job is not None:
                 result.append(worker.current_job.inspect())
-        for job_status in self.past_jobs_status:
-            result.append(job_status)
+        for job in self.past_jobs:
+            result.append(job.inspect())
         return result
 
 
+    def has_room(self, worker: PlottingWorker) -> bool:
+        """Whether the destination of the worker can take one more plot,
+        considering the plots still being produced for it.
+        """
+        if self.inventory is None:
+            return True
+        num_pending = 0
+        for other in self.workers:
+            if other.current_job is not None and other.destination == worker.destination:
+                num_pending += 1
+        return self.inventory.has_room(worker.destination, num_pending = num_pending)
+
+
+    def inspect_inventory(self):
+        if self.inventory is None:
+            return {
+                'capacity': [],
+                'duplicates': {},
+            }
+        return self.inventory.inspect()
+
+
     def inspect_workers(self):
         return [worker.inspect() for worker in self.workers]
 
@@ -183,9 +318,64 @@ class ChiaManager(object):
 
     def ensure_shutdown(self):
         self.shutting_down = True
-        if self.thread is None:
-            return
-        self.thread.join()
+        if self.thread is not None:
+            self.thread.join()
+        if self.inventory_thread is not None:
+            self.inventory_thread.join()
+        if self.verifier is not None:
+            self.verifier.ensure_shutdown()
+
+
+    def find_worker(self, worker_name: str):
+        for worker in self.workers:
+            if worker.name == worker_name:
+                return worker
+        return None
+
+
+    def drain_worker(self, worker_name: str) -> bool:
+        worker = self.find_worker(worker_name)
+        if worker is None:
+            return False
+        worker.drain()
+        return True
+
+
+    def undrain_worker(self, worker_name: str) -> bool:
+        worker = self.find_worker(worker_name)
+        if worker is None:
+            return False
+        worker.undrain()
+        return True
+
+
+    def pause_worker(self, worker_name: str, release_cpus: bool = False) -> bool:
+        """Suspend the job of the worker.
+
+        Its cpus stay reserved so that it can be resumed at any time,
+        unless release_cpus is set to hand them over to new jobs.
+        """
+        worker = self.find_worker(worker_name)
+        if worker is None:
+            return False
+        return worker.pause_job(release_cpus = release_cpus)
+
+
+    def resume_worker(self, worker_name: str, force: bool = False) -> bool:
+        """Resume the suspended job of the worker.
+
+        Unless force is set, this only happens when there are enough
+        free cpus for the stage the job is in.
+        """
+        worker = self.find_worker(worker_name)
+        if worker is None or worker.current_job is None or not worker.current_job.paused:
+            return False
+        # The cpus still reserved by the job itself are available to it.
+        available_cpus = (os.cpu_count() - self.used_cpu_count() +
+                          worker.current_job.used_cpu_count())
+        if not force and worker.current_job.required_cpu_count() > available_cpus:
+            return False
+        return worker.resume_job()
 
 
     def abort_job(self, spec: str):
@@ -0,0 +1,120 @@
+import sys
+import json
+import click
+
+# Keep the imports at the top of this module light. The daemon (flask
+# and the manager stack) is only imported when it is actually started,
+# so that the client subcommands return quickly.
+from .control import DEFAULT_CONTROL_SOCKET, ControlError, send_command
+
+
+@click.group(invoke_without_command = True)
+@click.option('--farm_key', default = '',
+              type = click.STRING, help = 'Farm key')
+@click.option('--pool_key', default = '',
+              type = click.STRING, help = 'Pool Key')
+@click.option('workers', '--worker', multiple = True,
+              type = click.STRING, help = 'a WORKSPACE:DESTINATION pair')
+@click.option('--is_mock', default = False,
+              type = click.BOOL, help = 'Whether to run plotter simulator')
+@click.option('--port', default = '5000',
+              type = click.STRING, help = 'Specify the port')
+# Enable threading to avoid writing to the disk simultaneously
+@click.option('--staggering', default = 600,
+              type = click.INT, help = 'Staggering in seconds for multi-threading')
+@click.option('--forward_concurrency', default = 4,
+              type = click.INT, help = 'The number of threads used for the forward stage of each job')
+@click.option('--use_chiabox', default = True,
+              type = click.BOOL, help = 'whether it relies on the chiabox docker')
+@click.option('--verify_plots', default = False,
+              type = click.BOOL, help = 'Whether to verify each plot after it is done')
+@click.option('--verify_challenges', default = 30,
+              type = click.INT, help = 'The number of challenges used to check the proofs of a plot')
+@click.option('--verify_concurrency', default = 1,
+              type = click.INT, help = 'The maximum number of plots being verified at the same time')
+@click.option('plot_dirs', '--plot_dir', multiple = True,
+              type = click.STRING, help = 'an extra directory of plots to keep in the plot inventory')
+@click.option('--plot_index', default = '',
+              type = click.STRING, help = 'Where to keep the plot inventory, which is disabled if empty')
+@click.option('--inventory_interval', default = 300,
+              type = click.INT, help = 'Seconds between two refreshes of the plot inventory')
+@click.option('--control_socket', default = DEFAULT_CONTROL_SOCKET,
+              type = click.STRING,
+              help = ('The unix socket for the subcommands, disabled if empty. '
+                      'Each daemon on the same host needs its own socket'))
+@click.pass_context
+def main(ctx, control_socket, **options):
+    """Run the chiafan daemon, or one of the subcommands talking to it."""
+    ctx.obj = control_socket
+    if ctx.invoked_subcommand is None:
+        from .app import serve
+        try:
+            serve(control_socket = control_socket, **options)
+        except ControlError as err:
+            raise click.ClickException(f'{err}')
+
+
+def _send(socket_path: str, command: str, **kwargs):
+    try:
+        reply = send_command(socket_path, command, **kwargs)
+    except ControlError as err:
+        click.echo(f'{err}', err = True)
+        sys.exit(1)
+    click.echo(json.dumps(reply, indent = 2))
+    if reply.get('code') == 'failed':
+        sys.exit(1)
+
+
+@main.command()
+@click.pass_obj
+def status(socket_path):
+    """Show the status of the server, the workers and the jobs."""
+    _send(socket_path, 'status')
+
+
+@main.command()
+@click.argument('target', required = False)
+@click.pass_obj
+def drain(socket_path, target):
+    """Stop spawning new jobs, on all workers or on the TARGET worker."""
+    _send(socket_path, 'drain', target = target)
+
+
+@main.command()
+@click.argument('target')
+@click.pass_obj
+def abort(socket_path, target):
+    """Abort the job TARGET, e.g. worker1.job3."""
+    _send(socket_path, 'abort', target = target)
+
+
+@main.command()
+@click.argument('logs', nargs = -1, required = True,
+                type = click.Path(exists = True, dir_okay = False))
+def analyze(logs):
+    """Summarize the phase timings of plotting LOGS."""
+    from .job import STAGE_END_PATTERN, COMPLETE_PATTERN, Stage
+    totals = {}
+    for log in logs:
+        phases = []
+        final_plot = None
+        with open(log, 'r', errors = 'replace') as f:
+            for line in f:
+                m = STAGE_END_PATTERN.match(line)
+                if m is not None:
+                    phases.append((Stage.from_stage_id(int(m.groups()[0])),
+                                   float(m.groups()[1])))
+                    continue
+                m = COMPLETE_PATTERN.match(line)
+                if m is not None:
+                    final_plot = m.groups()[0]
+        click.echo(log)
+        for stage, seconds in phases:
+            totals.setdefault(stage, []).append(seconds)
+            click.echo(f'  {stage.name:<20} {seconds / 3600.0:7.2f} h')
+        click.echo(f'  {"TOTAL":<20} {sum(x for _, x in phases) / 3600.0:7.2f} h')
+        click.echo(f'  final plot: {final_plot or "NOT FOUND"}')
+    if len(logs) > 1:
+        click.echo(f'Average over {len(logs)} logs')
+        for stage, values in totals.items():
+            click.echo(f'  {stage.name:<20} {sum(values) / len(values) / 3600.0:7.2f} h')
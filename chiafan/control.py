@@ -0,0 +1,97 @@
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+
+
+# This module is imported by the command line client, so it must stay
+# free of heavy imports (flask, the manager stack, ...).
+
+DEFAULT_CONTROL_SOCKET = '/tmp/chiafan.sock'
+
+
+class ControlError(Exception):
+    pass
+
+
+def send_command(socket_path: str, command: str, timeout: float = 10.0, **kwargs):
+    """Send a command to the running daemon and return its reply.
+
+    The protocol is one JSON object per line in each direction.
+    Raises ControlError if the daemon cannot be reached.
+    """
+    request = dict(kwargs, command = command)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(socket_path)
+            conn.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with conn.makefile('rb') as reader:
+                line = reader.readline()
+    except OSError as err:
+        raise ControlError(f'Cannot reach chiafan at {socket_path}: {err}')
+    if len(line) == 0:
+        raise ControlError(f'No reply from chiafan at {socket_path}')
+    return json.loads(line.decode('utf-8'))
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            command = request.pop('command')
+            handler = self.server.handlers.get(command)
+            if handler is None:
+                reply = {'code': 'failed', 'error': f'Unknown command "{command}"'}
+            else:
+                reply = handler(**request)
+        except Exception as err:
+            reply = {'code': 'failed', 'error': f'{err}'}
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves the commands of the command line client on a Unix socket.
+
+    handlers maps the command names to functions taking the arguments
+    of the command and returning a JSON serializable reply.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, handlers):
+        # A socket file left over by a previous run prevents binding,
+        # but one that is still served belongs to another daemon.
+        if os.path.exists(socket_path):
+            try:
+                send_command(socket_path, 'ping', timeout = 1.0)
+            except ControlError:
+                try:
+                    os.remove(socket_path)
+                except OSError as err:
+                    raise ControlError(f'Cannot remove stale socket {socket_path}: {err}')
+            else:
+                raise ControlError(f'Another chiafan is serving {socket_path}')
+        super().__init__(socket_path, _ControlHandler)
+        self.socket_path = socket_path
+        self.handlers = handlers
+        self.thread = None
+
+
+    def start(self):
+        self.thread = threading.Thread(target = self.serve_forever, daemon = True)
+        self.thread.start()
+        logging.info(f'Listening for commands on {self.socket_path}')
+
+
+    def ensure_shutdown(self):
+        if self.thread is None:
+            return
+        self.shutdown()
+        self.server_close()
+        self.thread = None
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
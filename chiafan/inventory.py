@@ -0,0 +1,313 @@
+import os
+import json
+import shutil
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from .plot_file import (PlotHeaderError, read_plot_header, expected_plot_size,
+                        MIN_SIZE_RATIO, MAX_SIZE_RATIO)
+
+
+INDEX_VERSION = 1
+
+# The plots produced by chiafan are k32, the default of "chia plots
+# create" which is run without "-k".
+PLOTTER_K = 32
+
+
+class PlotRecord(object):
+    def __init__(self, path: str, size: int, mtime: float,
+                 plot_id: str = None, k: int = None,
+                 farmer_key: str = None, pool_key: str = None,
+                 error: str = None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.plot_id = plot_id
+        self.k = k
+        self.farmer_key = farmer_key
+        self.pool_key = pool_key
+        # Set when the header cannot be parsed
+        self.error = error
+
+
+    @staticmethod
+    def from_file(path: Path, stat: os.stat_result):
+        record = PlotRecord(path = str(path),
+                            size = stat.st_size,
+                            mtime = stat.st_mtime)
+        try:
+            header = read_plot_header(path)
+            record.plot_id = header.plot_id.hex()
+            record.k = header.k
+            record.farmer_key = header.farmer_key.hex()
+            record.pool_key = header.pool_key.hex()
+        except (OSError, PlotHeaderError) as err:
+            record.error = f'{err}'
+        return record
+
+
+    def is_complete(self) -> bool:
+        """Whether the record looks like a fully written plot.
+
+        Incomplete records, e.g. of a plot still being copied in, are
+        checked again on every refresh.
+        """
+        if self.error is not None or self.k is None:
+            return False
+        return self.size >= MIN_SIZE_RATIO * expected_plot_size(self.k)
+
+
+    @staticmethod
+    def from_payload(payload):
+        return PlotRecord(**payload)
+
+
+    def to_payload(self):
+        return {
+            'path': self.path,
+            'size': self.size,
+            'mtime': self.mtime,
+            'plot_id': self.plot_id,
+            'k': self.k,
+            'farmer_key': self.farmer_key,
+            'pool_key': self.pool_key,
+            'error': self.error,
+        }
+
+
+class PlotInventory(object):
+    """An incremental index of the plots sitting in a set of directories.
+
+    Only the headers of the plots are read. Results are persisted to
+    index_path, and a refresh only lists directories whose mtime has
+    changed and only parses files that are new or whose size or mtime
+    has changed. Incomplete records (see PlotRecord.is_complete()) are
+    checked again on every refresh.
+    """
+    def __init__(self, index_path: Path, max_workers: int = 8):
+        self.index_path = index_path
+        self.max_workers = max_workers
+        self.directories = []
+        # Directory -> {path -> PlotRecord}
+        self.records = {}
+        # Directory -> mtime when it was last listed
+        self.directory_mtimes = {}
+        self.lock = threading.Lock()
+        # Serializes the writes of the index file, which happen from
+        # both the refresh thread and the manager.
+        self.save_lock = threading.Lock()
+        self.load()
+
+
+    def add_directory(self, directory: Path):
+        directory = str(directory)
+        with self.lock:
+            if directory not in self.directories:
+                self.directories.append(directory)
+                self.records.setdefault(directory, {})
+
+
+    def load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') != INDEX_VERSION:
+                logging.warning(f'Ignoring plot index {self.index_path} of a different version')
+                return
+            for directory, entry in index['directories'].items():
+                self.directory_mtimes[directory] = entry['mtime']
+                self.records[directory] = {
+                    payload['path']: PlotRecord.from_payload(payload)
+                    for payload in entry['plots']
+                }
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            logging.warning(f'Cannot load plot index {self.index_path}: {err}')
+            self.records = {}
+            self.directory_mtimes = {}
+
+
+    def save(self):
+        with self.lock:
+            index = {
+                'version': INDEX_VERSION,
+                'directories': {
+                    directory: {
+                        'mtime': self.directory_mtimes.get(directory),
+                        'plots': [record.to_payload() for record in records.values()],
+                    } for directory, records in self.records.items()
+                    if directory in self.directories
+                },
+            }
+        with self.save_lock:
+            self.index_path.parent.mkdir(parents = True, exist_ok = True)
+            # Write to a temporary file first so that the index is never
+            # left half written.
+            tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+
+
+    def refresh(self):
+        """Bring the index up to date with all the directories, in parallel."""
+        with self.lock:
+            directories = list(self.directories)
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            changed = list(executor.map(self._refresh_directory, directories))
+        if any(changed):
+            self.save()
+
+
+    def _refresh_directory(self, directory: str) -> bool:
+        """Returns whether the records of this directory have changed."""
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return False
+        # Creating, removing or renaming a plot updates the mtime of
+        # the directory, and finished plots are never modified in
+        # place. An unchanged mtime means only the incomplete records
+        # need another look.
+        if self.directory_mtimes.get(directory) == mtime:
+            return self._recheck_incomplete(directory)
+
+        with self.lock:
+            known = dict(self.records.get(directory, {}))
+        records = {}
+        for entry in os.scandir(directory):
+            if not entry.name.endswith('.plot') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            record = known.get(entry.path)
+            if (record is None or record.size != stat.st_size or
+                record.mtime != stat.st_mtime):
+                record = PlotRecord.from_file(Path(entry.path), stat)
+            records[entry.path] = record
+
+        with self.lock:
+            self.records[directory] = records
+            self.directory_mtimes[directory] = mtime
+        logging.info(f'Indexed {len(records)} plots in {directory}')
+        return True
+
+
+    def _recheck_incomplete(self, directory: str) -> bool:
+        """Update the incomplete records of the directory whose file has
+        changed since. Returns whether any record was updated.
+        """
+        with self.lock:
+            incomplete = [r for r in self.records.get(directory, {}).values()
+                          if not r.is_complete()]
+        changed = False
+        for record in incomplete:
+            try:
+                stat = os.stat(record.path)
+            except OSError:
+                # Removed files are handled by the next listing, as
+                # removing changes the mtime of the directory.
+                continue
+            if record.size == stat.st_size and record.mtime == stat.st_mtime:
+                continue
+            with self.lock:
+                self.records[directory][record.path] = PlotRecord.from_file(
+                    Path(record.path), stat)
+            changed = True
+        return changed
+
+
+    def add_plot(self, path: Path):
+        """Index a single plot right away, e.g. one that was just produced."""
+        directory = str(path.parent)
+        try:
+            record = PlotRecord.from_file(path, path.stat())
+        except OSError:
+            return
+        with self.lock:
+            if directory not in self.directories:
+                return
+            self.records[directory][str(path)] = record
+        self.save()
+
+
+    def find_duplicates(self):
+        """Returns the paths of all the plots sharing the same plot id."""
+        by_plot_id = {}
+        with self.lock:
+            for directory in self.directories:
+                for record in self.records[directory].values():
+                    if record.plot_id is not None:
+                        by_plot_id.setdefault(record.plot_id, []).append(record.path)
+        return {plot_id: paths for plot_id, paths in by_plot_id.items()
+                if len(paths) > 1}
+
+
+    def plot_size(self, directory: str) -> int:
+        """The expected size of the next plot written to directory.
+
+        This is the average size of the indexed k32 plots in the
+        directory, or in all the directories if it has none yet. Only
+        plots of a plausible size are counted, and the theoretical size
+        is used when there are none.
+        """
+        expected = expected_plot_size(PLOTTER_K)
+        def plausible(record):
+            return (record.error is None and record.k == PLOTTER_K and
+                    MIN_SIZE_RATIO * expected <= record.size <= MAX_SIZE_RATIO * expected)
+        with self.lock:
+            local = [r.size for r in self.records.get(directory, {}).values()
+                     if plausible(r)]
+            overall = [r.size for d in self.directories for r in self.records[d].values()
+                       if plausible(r)]
+        sizes = local if len(local) > 0 else overall
+        if len(sizes) == 0:
+            return expected
+        return sum(sizes) // len(sizes)
+
+
+    def capacity(self, directory: str):
+        with self.lock:
+            records = list(self.records.get(directory, {}).values())
+        result = {
+            'directory': directory,
+            'num_plots': len(records),
+            'num_bad_plots': len([r for r in records if r.error is not None]),
+            'plot_bytes': sum(r.size for r in records),
+            'free_bytes': None,
+            'free_plot_slots': None,
+        }
+        try:
+            free = shutil.disk_usage(directory).free
+            result['free_bytes'] = free
+            result['free_plot_slots'] = free // self.plot_size(directory)
+        except OSError:
+            pass
+        return result
+
+
+    def has_room(self, directory: Path, num_pending: int = 0) -> bool:
+        """Whether the directory can take another plot, on top of
+        num_pending plots that are still being produced for it.
+
+        The size of a plot is estimated from the index, see plot_size().
+
+        Directories that are not visible from here (e.g. only inside
+        the chiabox container) are assumed to have room.
+        """
+        try:
+            free = shutil.disk_usage(directory).free
+        except OSError:
+            return True
+        return free >= (num_pending + 1) * self.plot_size(str(directory))
+
+
+    def inspect(self):
+        with self.lock:
+            directories = list(self.directories)
+        return {
+            'capacity': [self.capacity(directory) for directory in directories],
+            'duplicates': self.find_duplicates(),
+        }
@@ -9,7 +9,8 @@ from datetime import datetime, timedelta
 import re
 import threading
 from enum import Enum
-from .utils import format_age
+from .utils import format_age, signal_process_tree
+from .verifier import PlotVerifier, VerificationResult, VerificationState
 
 
 STAGE_START_PATTERN = re.compile('^Starting phase (\d)/.*')
@@ -26,8 +27,9 @@ class Stage(Enum):
     BACKWARD = 3
     COMPRESSION = 4
     WRITE_CHECKPOINT = 5
-    S3_MIGRATION = 6
-    END = 7
+    VERIFICATION = 6
+    S3_MIGRATION = 7
+    END = 8
 
     @staticmethod
     def from_stage_id(stage_id: int):
@@ -42,6 +44,11 @@ class Stage(Enum):
         return Stage.END
 
 
+# Stages during which the plotter can be suspended without losing the
+# work done so far.
+PAUSABLE_STAGES = [Stage.FORWARD, Stage.BACKWARD, Stage.COMPRESSION, Stage.WRITE_CHECKPOINT]
+
+
 class JobState(Enum):
     ONGOING = 1
     FAIL = 2
@@ -69,13 +76,17 @@ class JobStatus(object):
                  stage: Stage = None,
                  state: JobState = None,
                  stage_details: StageDetail = [],
-                 progress: float = None):
+                 progress: float = None,
+                 verification: VerificationResult = None,
+                 paused: bool = False):
         self.job_name = job_name
         self.time_elapsed = time_elapsed
         self.stage = stage
         self.stage_details = stage_details
         self.progress = progress
         self.state = state
+        self.verification = verification
+        self.paused = paused
 
 
     def to_payload(self):
@@ -87,6 +98,9 @@ class JobStatus(object):
                       else self.stage.name),
             'stageDetails': [ x.to_payload() for x in self.stage_details],
             'progress': f'{self.progress:.2f} %',
+            'paused': self.paused,
+            'verification': (None if self.verification is None
+                             else self.verification.to_payload()),
         }
 
 
@@ -99,7 +113,9 @@ class PlottingJob(object):
                  farm_key: str = '',
                  pool_key: str = '',
                  use_chiabox: bool = True,
-                 is_mock: bool = False):
+                 is_mock: bool = False,
+                 verifier: PlotVerifier = None,
+                 wait_for_runtime = None):
         self.job_name = job_name
         self.plotting_space = plotting_space
         self.destination = destination
@@ -109,6 +125,14 @@ class PlottingJob(object):
         self.s3_bucket = s3_bucket
         self.use_chiabox = use_chiabox
         self.is_mock = is_mock
+        # When set, the final plot is handed over to the verifier
+        # before the job is considered done.
+        self.verifier = verifier
+        self.verification = None
+        self.final_plot = None
+        # When set, called before running any command to wait for the
+        # runtime (i.e. the chiabox docker) to be ready.
+        self.wait_for_runtime = wait_for_runtime
 
         self.starting_time = datetime.now()
         self.stop_time = None
@@ -121,6 +145,9 @@ class PlottingJob(object):
         self.stage = Stage.INITIALIZATION
         self.stage_details = []
         self.progress = 0.0
+        self.paused = False
+        # Whether the cpus of the paused job may be taken by new jobs
+        self.releases_cpus = False
 
         self.proc = None
         self.thread = threading.Thread(target = PlottingJob.run,
@@ -137,7 +164,9 @@ class PlottingJob(object):
             stage = self.stage,
             stage_details = self.stage_details,
             state = self.state,
-            progress = self.progress)
+            progress = self.progress,
+            verification = self.verification,
+            paused = self.paused)
 
 
     def run(self):
@@ -153,6 +182,12 @@ class PlottingJob(object):
             self.stop_time = datetime.now()
             return
 
+        if self.wait_for_runtime is not None and not self.wait_for_runtime():
+            self.state = JobState.FAIL
+            self.error_message = 'Chiabox docker failed to start'
+            self.stop_time = datetime.now()
+            return
+
         # Ensure directory exists
         # TODO(breakds): Make this more general
         if self.is_mock:
@@ -264,11 +299,23 @@ class PlottingJob(object):
             return
 
         logging.info(f'Succesfully done plot with {self.job_name}. Final plot at {final_plot}')
+        self.final_plot = final_plot
 
         if self.s3_bucket == '':
+            if self.verifier is not None:
+                # The verification runs in the verifier's own pool, so
+                # that the worker can move on to the next plot.
+                self.progress = 99.0
+                self.stage = Stage.VERIFICATION
+                self.verification = self.verifier.submit(
+                    final_plot, on_done = self.on_verified,
+                    use_chiabox = self.use_chiabox,
+                    is_mock = self.is_mock)
+                return
             self.stage = Stage.END
             self.state = JobState.SUCCESS
             self.progress = 100.0
+            self.stop_time = datetime.now()
             return
 
         # Migrate to S3
@@ -293,10 +340,77 @@ class PlottingJob(object):
         self.progress = 100.0
         self.stage = Stage.END
         self.state = JobState.SUCCESS
+        self.stop_time = datetime.now()
+
+
+    def on_verified(self, result: VerificationResult):
+        if result.state is VerificationState.FAIL:
+            self.state = JobState.FAIL
+            self.error_message = f'Plot verification failed: {result.message}'
+            logging.error(f'Job {self.job_name} failed due to "{self.error_message}"')
+        else:
+            if result.state is VerificationState.ERROR:
+                logging.warning(f'Job {self.job_name}: {result.message}')
+            self.state = JobState.SUCCESS
+        self.progress = 100.0
+        self.stage = Stage.END
+        self.stop_time = datetime.now()
+
+
+    def pause(self, release_cpus: bool = False) -> bool:
+        """Suspend the plotter with SIGSTOP, keeping its temporary files.
+
+        The cpus of a paused job stay reserved for it, unless
+        release_cpus is set, in which case new jobs may take them.
+
+        Returns False if the job is not in a stage that can be paused.
+        """
+        if self.paused:
+            self.releases_cpus = release_cpus
+            return True
+        if (self.stage not in PAUSABLE_STAGES or self.proc is None or
+            self.proc.poll() is not None):
+            return False
+        if not self._signal_plotter('STOP'):
+            return False
+        self.paused = True
+        self.releases_cpus = release_cpus
+        logging.info(f'Paused job {self.job_name} in stage {self.stage.name}')
+        return True
+
+
+    def resume(self) -> bool:
+        """Returns False if the job is not paused or cannot be resumed."""
+        if not self.paused:
+            return False
+        if not self._signal_plotter('CONT'):
+            return False
+        self.paused = False
+        self.releases_cpus = False
+        logging.info(f'Resumed job {self.job_name} in stage {self.stage.name}')
+        return True
+
+
+    def _signal_plotter(self, signame: str) -> bool:
+        try:
+            if self.use_chiabox and not self.is_mock:
+                # Signaling "docker exec" does not reach the plotter
+                # inside the container, so signal it from within.
+                subprocess.check_output([
+                    'docker', 'exec', 'chiabox', 'pkill', f'-{signame}',
+                    '-f', f'plots create .*-t {re.escape(str(self.plotting_space))} '])
+            else:
+                signal_process_tree(self.proc.pid, getattr(signal, f'SIG{signame}'))
+        except Exception as err:
+            logging.error(f'Cannot send SIG{signame} to the plotter of {self.job_name}: {err}')
+            return False
+        return True
 
 
     def ensure_shutdown(self):
         self.shutting_down = True
+        # A stopped plotter would otherwise stay around forever.
+        self.resume()
         if self.proc is not None:
             self.proc.kill()
             self.state = JobState.FAIL
@@ -333,6 +447,13 @@ class PlottingJob(object):
 
 
     def used_cpu_count(self):
+        if self.paused and self.releases_cpus:
+            return 0
+        return self.required_cpu_count()
+
+
+    def required_cpu_count(self):
+        """The number of cpus the job needs in its current stage when running."""
         if self.stage in [Stage.INITIALIZATION, Stage.FORWARD]:
             return self.forward_concurrency
         elif self.stage in [Stage.BACKWARD, Stage.COMPRESSION, Stage.WRITE_CHECKPOINT]:
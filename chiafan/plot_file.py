@@ -0,0 +1,117 @@
+import struct
+from pathlib import Path
+
+
+# The on-disk plot format (v1.0) starts with the following header:
+#
+#   19 bytes  "Proof of Space Plot"
+#   32 bytes  plot id
+#    1 byte   k
+#    2 bytes  length of the format description (big endian)
+#    N bytes  format description, e.g. "v1.0"
+#    2 bytes  length of the memo (big endian)
+#    M bytes  memo
+PLOT_MAGIC = b'Proof of Space Plot'
+
+# Reading this many bytes is always enough to cover the full header.
+PLOT_HEADER_READ_SIZE = 1024
+
+# The memo is either
+#   pool public key (48) + farmer public key (48) + master secret key (32)
+# or, for plots created for a pool contract,
+#   pool contract puzzle hash (32) + farmer public key (48) + master secret key (32)
+PUBLIC_KEY_SIZE = 48
+PUZZLE_HASH_SIZE = 32
+MASTER_SK_SIZE = 32
+
+# Chia reports the actual plot size as a fraction of the theoretical
+# size, see UI_ACTUAL_SPACE_CONSTANT_FACTOR in chia-blockchain.
+ACTUAL_SPACE_CONSTANT_FACTOR = 0.762
+
+# A healthy plot is within a few percent of the expected size.
+MIN_SIZE_RATIO = 0.95
+MAX_SIZE_RATIO = 1.10
+
+
+class PlotHeaderError(Exception):
+    pass
+
+
+class PlotHeader(object):
+    def __init__(self, plot_id: bytes, k: int, format_description: str,
+                 memo: bytes):
+        self.plot_id = plot_id
+        self.k = k
+        self.format_description = format_description
+        self.memo = memo
+
+
+    @property
+    def uses_pool_contract(self) -> bool:
+        return len(self.memo) == PUZZLE_HASH_SIZE + PUBLIC_KEY_SIZE + MASTER_SK_SIZE
+
+
+    @property
+    def pool_key(self) -> bytes:
+        """The pool public key, or the pool contract puzzle hash."""
+        if self.uses_pool_contract:
+            return self.memo[:PUZZLE_HASH_SIZE]
+        return self.memo[:PUBLIC_KEY_SIZE]
+
+
+    @property
+    def farmer_key(self) -> bytes:
+        offset = PUZZLE_HASH_SIZE if self.uses_pool_contract else PUBLIC_KEY_SIZE
+        return self.memo[offset:offset + PUBLIC_KEY_SIZE]
+
+
+    def to_payload(self):
+        return {
+            'plotId': self.plot_id.hex(),
+            'k': self.k,
+            'format': self.format_description,
+            'farmerKey': self.farmer_key.hex(),
+            'poolKey': self.pool_key.hex(),
+        }
+
+
+def parse_plot_header(data: bytes) -> PlotHeader:
+    """Parse the header of a plot file from its leading bytes.
+
+    Raises PlotHeaderError if the bytes do not form a valid header.
+    """
+    offset = len(PLOT_MAGIC)
+    if data[:offset] != PLOT_MAGIC:
+        raise PlotHeaderError('Missing plot magic')
+    if len(data) < offset + 35:
+        raise PlotHeaderError('Truncated plot header')
+    plot_id = data[offset:offset + 32]
+    offset += 32
+    k = data[offset]
+    offset += 1
+    format_length, = struct.unpack('>H', data[offset:offset + 2])
+    offset += 2
+    format_description = data[offset:offset + format_length]
+    offset += format_length
+    if len(format_description) != format_length or len(data) < offset + 2:
+        raise PlotHeaderError('Truncated format description')
+    memo_length, = struct.unpack('>H', data[offset:offset + 2])
+    offset += 2
+    memo = data[offset:offset + memo_length]
+    if len(memo) != memo_length:
+        raise PlotHeaderError('Truncated memo')
+    return PlotHeader(plot_id = plot_id,
+                      k = k,
+                      format_description = format_description.decode('utf-8', 'replace'),
+                      memo = memo)
+
+
+def read_plot_header(path: Path) -> PlotHeader:
+    """Read and parse only the header of the plot file at path."""
+    with open(path, 'rb') as f:
+        return parse_plot_header(f.read(PLOT_HEADER_READ_SIZE))
+
+
+def expected_plot_size(k: int) -> int:
+    """The approximate size in bytes of a plot of size k."""
+    return int(((2 * k) + 1) * (2 ** (k - 1)) * ACTUAL_SPACE_CONSTANT_FACTOR)
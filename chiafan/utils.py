@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from pathlib import Path
+import os
 import subprocess
 import re
 
@@ -21,5 +22,36 @@ def check_chiabox_docker_status():
         output = subprocess.check_output(
             ['docker', 'inspect', '-f', '{{.State.Status}}', 'chiabox'])
         return output.decode('utf-8').strip()
-    except subprocess.CallProcessError as e:
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
         return 'not yet'
+
+
+def list_process_tree(pid: int):
+    """Returns the pid and all the descendant pids of the process."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # The command name may contain spaces, so look for the
+                # fields after its closing parenthesis.
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+    result = []
+    pending = [pid]
+    while len(pending) > 0:
+        current = pending.pop()
+        result.append(current)
+        pending.extend(children.get(current, []))
+    return result
+
+
+def signal_process_tree(pid: int, signum: int):
+    for target in list_process_tree(pid):
+        try:
+            os.kill(target, signum)
+        except ProcessLookupError:
+            pass
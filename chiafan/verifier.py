@@ -0,0 +1,209 @@
+import re
+import logging
+import threading
+import subprocess
+from enum import Enum
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from .plot_file import (PLOT_HEADER_READ_SIZE, PlotHeaderError,
+                        parse_plot_header, expected_plot_size,
+                        MIN_SIZE_RATIO, MAX_SIZE_RATIO)
+
+
+# Example: "Proofs 28 / 30, 0.9333"
+PROOFS_PATTERN = re.compile('.*Proofs (\d+) / (\d+).*')
+
+# Run the verification commands with the lowest CPU priority and in the
+# idle I/O scheduling class. Note that the I/O class is only honored by
+# the BFQ (and the former CFQ) scheduler, and has no effect under
+# mq-deadline or none, which NVMe drives usually use. Neither limits the
+# read throughput of a check; the actual bound on the I/O is the size of
+# the verifier pool, i.e. how many plots are checked at the same time.
+LOW_PRIORITY_PREFIX = ['ionice', '-c', '3', 'nice', '-n', '19']
+
+
+class VerificationState(Enum):
+    PENDING = 1
+    PASS = 2
+    FAIL = 3
+    SKIP = 4
+    # The checks could not be carried out, e.g. a command failed or
+    # timed out, which says nothing about the plot.
+    ERROR = 5
+
+
+class CommandError(Exception):
+    pass
+
+
+class VerificationResult(object):
+    def __init__(self, plot_path: str):
+        self.plot_path = plot_path
+        self.state = VerificationState.PENDING
+        self.k = None
+        self.size = None
+        self.proofs = None
+        self.challenges = None
+        self.message = ''
+
+
+    def to_payload(self):
+        return {
+            'state': self.state.name,
+            'plot': self.plot_path,
+            'k': self.k,
+            'size': self.size,
+            'proofs': (None if self.challenges is None
+                       else f'{self.proofs} / {self.challenges}'),
+            'message': self.message,
+        }
+
+
+class PlotVerifier(object):
+    """Checks finished plots in a bounded pool of background threads.
+
+    Each plot goes through a header check, a size check and a sampled
+    proof check (via `chia plots check`). Only these checks can lead to
+    FAIL. Checks that were not carried out are reported as SKIP, and
+    checks that broke down as ERROR.
+    """
+    def __init__(self, num_challenges: int = 30,
+                 max_workers: int = 1,
+                 min_proof_ratio: float = 0.5):
+        self.num_challenges = num_challenges
+        self.min_proof_ratio = min_proof_ratio
+        self.executor = ThreadPoolExecutor(max_workers = max_workers)
+        self.shutting_down = False
+        self.procs = set()
+        self.lock = threading.Lock()
+
+
+    def submit(self, plot_path: str, on_done,
+               use_chiabox: bool = True,
+               is_mock: bool = False) -> VerificationResult:
+        """Queue the plot for verification.
+
+        Returns the (pending) result right away. It is filled in and
+        passed to on_done once the verification finishes.
+        """
+        result = VerificationResult(plot_path)
+        self.executor.submit(PlotVerifier._run, self, result, on_done,
+                             use_chiabox, is_mock)
+        return result
+
+
+    def _run(self, result: VerificationResult, on_done,
+             use_chiabox: bool, is_mock: bool):
+        try:
+            if self.shutting_down:
+                result.state = VerificationState.SKIP
+                result.message = 'Verifier shut down before checking the plot'
+            elif is_mock:
+                result.state = VerificationState.SKIP
+                result.message = 'Mock plots are not verified'
+            else:
+                self._verify(result, use_chiabox)
+        except Exception as err:
+            # The verdicts are all set by _verify(), an exception means
+            # the checks could not be completed.
+            if self.shutting_down:
+                result.state = VerificationState.SKIP
+                result.message = 'Verifier shut down while checking the plot'
+            else:
+                result.state = VerificationState.ERROR
+                result.message = f'Could not check the plot: {err}'
+        logging.info(f'Verification of {result.plot_path}: {result.state.name} {result.message}')
+        on_done(result)
+
+
+    def _verify(self, result: VerificationResult, use_chiabox: bool):
+        # 1. Header check
+        try:
+            header = parse_plot_header(self._read_header(result.plot_path, use_chiabox))
+        except PlotHeaderError as err:
+            result.state = VerificationState.FAIL
+            result.message = f'Bad header: {err}'
+            return
+        result.k = header.k
+
+        # 2. Size check
+        result.size = self._file_size(result.plot_path, use_chiabox)
+        expected = expected_plot_size(header.k)
+        if not MIN_SIZE_RATIO * expected <= result.size <= MAX_SIZE_RATIO * expected:
+            result.state = VerificationState.FAIL
+            result.message = f'Unexpected size {result.size} for k{header.k} (expected ~{expected})'
+            return
+
+        # 3. Sampled proof check
+        output = self._call([
+            'venv/bin/chia' if use_chiabox else 'chia',
+            'plots', 'check',
+            '-g', Path(result.plot_path).name,
+            '-n', f'{self.num_challenges}',
+        ], use_chiabox = use_chiabox, timeout = 3600)
+        m = None
+        for line in output.decode('utf-8', 'replace').splitlines():
+            m = PROOFS_PATTERN.match(line) or m
+        if m is None:
+            # This happens when the destination is not one of the plot
+            # directories chia is configured with, which is a matter of
+            # the host configuration rather than of the plot.
+            result.state = VerificationState.SKIP
+            result.message = ('Proofs not checked, plot not found by "chia plots check". '
+                              'Add the destination with "chia plots add".')
+            return
+        result.proofs = int(m.groups()[0])
+        result.challenges = int(m.groups()[1])
+        if result.proofs < self.min_proof_ratio * result.challenges:
+            result.state = VerificationState.FAIL
+            result.message = 'Too few proofs found'
+            return
+
+        result.state = VerificationState.PASS
+
+
+    def _read_header(self, plot_path: str, use_chiabox: bool) -> bytes:
+        if use_chiabox:
+            return self._call(['head', '-c', f'{PLOT_HEADER_READ_SIZE}', plot_path],
+                              use_chiabox = True)
+        with open(plot_path, 'rb') as f:
+            return f.read(PLOT_HEADER_READ_SIZE)
+
+
+    def _file_size(self, plot_path: str, use_chiabox: bool) -> int:
+        if use_chiabox:
+            return int(self._call(['stat', '-c', '%s', plot_path], use_chiabox = True))
+        return Path(plot_path).stat().st_size
+
+
+    def _call(self, command, use_chiabox: bool, timeout: float = 60) -> bytes:
+        command = LOW_PRIORITY_PREFIX + command
+        if use_chiabox:
+            command = ['docker', 'exec', 'chiabox'] + command
+        try:
+            proc = subprocess.Popen(command, stdout = subprocess.PIPE,
+                                    stderr = subprocess.STDOUT)
+        except OSError as err:
+            raise CommandError(f'Cannot run {" ".join(command)}: {err}')
+        with self.lock:
+            self.procs.add(proc)
+        try:
+            output, _ = proc.communicate(timeout = timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise CommandError(f'Timed out running {" ".join(command)}')
+        finally:
+            with self.lock:
+                self.procs.discard(proc)
+        if proc.returncode != 0:
+            raise CommandError(f'"{" ".join(command)}" returned {proc.returncode}')
+        return output
+
+
+    def ensure_shutdown(self):
+        self.shutting_down = True
+        with self.lock:
+            for proc in self.procs:
+                proc.kill()
+        self.executor.shutdown(wait = True)
@@ -3,6 +3,7 @@ import time
 import threading
 from pathlib import Path
 from .job import PlottingJob
+from .verifier import PlotVerifier
 
 
 class PlottingWorker(object):
@@ -20,9 +21,14 @@ class PlottingWorker(object):
         self.job_index = 0
         self.use_chiabox = use_chiabox
         self.is_mock = is_mock
+        # A draining worker finishes its current job but does not take
+        # new ones.
+        self.draining = False
 
 
-    def spawn_job(self, farm_key: str, pool_key: str):
+    def spawn_job(self, farm_key: str, pool_key: str,
+                  verifier: PlotVerifier = None,
+                  wait_for_runtime = None):
         self.job_index += 1
         self.current_job = PlottingJob(
             job_name = f'{self.name}.job{self.job_index}',
@@ -34,7 +40,9 @@ class PlottingWorker(object):
             pool_key = pool_key,
             log_dir = Path('/tmp'),
             use_chiabox = self.use_chiabox,
-            is_mock = self.is_mock)
+            is_mock = self.is_mock,
+            verifier = verifier,
+            wait_for_runtime = wait_for_runtime)
 
 
     def inspect(self):
@@ -43,6 +51,8 @@ class PlottingWorker(object):
             'running': 'NOTHING' if self.current_job is None else self.current_job.job_name,
             'plottingSpace': str(self.plotting_space),
             'destination': str(self.destination),
+            'draining': self.draining,
+            'paused': self.current_job is not None and self.current_job.paused,
         }
 
 
@@ -53,6 +63,26 @@ class PlottingWorker(object):
         self.current_job.ensure_shutdown()
 
 
+    def drain(self):
+        self.draining = True
+
+
+    def undrain(self):
+        self.draining = False
+
+
+    def pause_job(self, release_cpus: bool = False) -> bool:
+        if self.current_job is None:
+            return False
+        return self.current_job.pause(release_cpus = release_cpus)
+
+
+    def resume_job(self) -> bool:
+        if self.current_job is None:
+            return False
+        return self.current_job.resume()
+
+
     def abort_job(self):
         if self.current_job is not None:
             self.current_job.abort()
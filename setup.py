@@ -12,7 +12,7 @@ setup(
     include_package_data=True,
     entry_points={
         'console_scripts': [
-            'chiafan=chiafan.app:main',
+            'chiafan=chiafan.cli:main',
         ],
     },
     python_requires='>=3.6',